@@ -1,58 +1,174 @@
 import requests
-import json
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
 from typing import Dict, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from json_utils import load_json, dump_json
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """API endpoints and avatar settings for one avatar provider"""
+    create_url: str
+    status_url: str
+    avatar_id: str  # HeyGen avatar ID / D-ID presenter ID
+    voice_id: str
+
+
+HEYGEN_CONFIG = ProviderConfig(
+    create_url="https://api.heygen.com/v2/video/generate",
+    status_url="https://api.heygen.com/v1/video_status.get",
+    avatar_id="Thaddeus_Black_Suit_public",  # Sample avatar ID
+    voice_id="2b5a8ab8a0a74166a031d6eda4321600"
+)
+
+DID_CONFIG = ProviderConfig(
+    create_url="https://api.d-id.com/talks",
+    status_url="https://api.d-id.com/talks/{talk_id}",
+    avatar_id="amy-Aq6OmGZnMt",  # Sample presenter
+    voice_id="en-US-JennyNeural"
+)
+
+DID_PRESENTER_URL = (
+    "https://create-images-results.d-id.com/DefaultPresenters/"
+    f"{DID_CONFIG.avatar_id}/image.png"
+)
+
+PROVIDER_CONFIGS = {
+    "heygen": HEYGEN_CONFIG,
+    "d-id": DID_CONFIG
+}
+
 
 class AvatarVideoGenerator:
     """
     Integrate with HeyGen or D-ID API to create AI avatar commentary videos
     """
     
-    def __init__(self, provider="heygen", api_key=None):
+    def __init__(self, provider="heygen", api_key=None, max_workers=8, max_concurrent_creates=4):
         """
         Initialize avatar generator
         provider: 'heygen' or 'd-id'
+        max_workers: number of status checks / downloads issued in parallel per poll
+        max_concurrent_creates: video jobs submitted at once (keep within provider rate limits)
         """
         self.provider = provider
         self.api_key = api_key
+        # Endpoints and avatar settings; None for unknown providers (mock output)
+        self.cfg = PROVIDER_CONFIGS.get(provider)
+        self.max_workers = max_workers
+        self.max_concurrent_creates = max_concurrent_creates
+        
+        # Status reported by the provider -> polling handler
+        self._status_handlers = {
+            "completed": self._on_completed,
+            "error": self._on_error,
+            "processing": self._on_pending,
+            "pending": self._on_pending
+        }
         self.output_dir = "avatar_videos"
         os.makedirs(self.output_dir, exist_ok=True)
         
-        # API endpoints
-        self.endpoints = {
-            "heygen": {
-                "create": "https://api.heygen.com/v2/video/generate",
-                "status": "https://api.heygen.com/v1/video_status.get"
-            },
-            "d-id": {
-                "create": "https://api.d-id.com/talks",
-                "status": "https://api.d-id.com/talks/{talk_id}"
-            }
-        }
+        # Shared HTTP session: keeps TLS connections alive across the
+        # poll / download calls instead of reconnecting each time.
+        # Only idempotent GETs are retried on server errors
+        self.session = self._create_session(Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True
+        ))
         
-        # Avatar configurations
-        self.avatar_configs = {
-            "heygen": {
-                "avatar_id": "Thaddeus_Black_Suit_public",  # Sample avatar ID
-                "voice_id": "2b5a8ab8a0a74166a031d6eda4321600"
-            },
-            "d-id": {
-                "presenter_id": "amy-Aq6OmGZnMt",  # Sample presenter
-                "voice_id": "en-US-JennyNeural"
-            }
-        }
+        # Creates get their own session. A create that timed out or failed
+        # with a 5xx may still have been accepted, and resending it would
+        # start a second billable job, so only 429 (rejected outright; the
+        # requests are no longer spaced out) and failed connects are retried
+        self.create_session = self._create_session(Retry(
+            total=3,
+            read=0,
+            other=0,
+            backoff_factor=0.5,
+            status_forcelist=[429],
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True
+        ))
+        
+        # Separate HTTP/2 client for CDN downloads (no API auth headers).
+        # Optional: needs httpx with the http2 extra, else the session is used.
+        self.download_client = self._create_download_client()
+    
+    def _create_session(self, retry: Retry) -> requests.Session:
+        """API session with pooled connections, the given retry policy and auth headers"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"accept": "application/json"})
+        
+        if self.api_key:
+            if self.provider == "d-id":
+                session.headers.update({"Authorization": f"Basic {self.api_key}"})
+            else:
+                session.headers.update({"x-api-key": self.api_key})
+        return session
+    
+    @staticmethod
+    def _create_download_client():
+        """HTTP/2 download client, or None when httpx/h2 are not installed"""
+        if httpx is None:
+            return None
+        try:
+            # Retries cover connection failures, like the session's adapter
+            transport = httpx.HTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+            )
+        except ImportError:
+            return None  # h2 package not installed
+        return httpx.Client(transport=transport, timeout=60, follow_redirects=True)
+    
+    def close(self):
+        """Close the HTTP sessions and download client and their pooled connections"""
+        if self.download_client is not None:
+            self.download_client.close()
+            self.download_client = None
+        self.session.close()
+        self.create_session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
+    @cached_property
+    def voices(self) -> requests.Response:
+        """Response of the HeyGen voice listing, fetched once per instance"""
+        return self.session.get("https://api.heygen.com/v2/voices", timeout=10)
+    
+    @cached_property
+    def avatars(self) -> requests.Response:
+        """Response of the HeyGen avatar listing, fetched once per instance"""
+        return self.session.get("https://api.heygen.com/v2/avatars", timeout=10)
+    
     def test_voices(self):
         """Tests the API key by trying to list available voices."""
         test_url = "https://api.heygen.com/v2/voices"
-        headers = {
-            "x-api-key": self.api_key,
-            "accept": "application/json"
-        }
         print(f"\n🔬 Testing API key with GET request to: {test_url}")
         try:
-            response = requests.get(test_url, headers=headers, timeout=10)
+            response = self.voices
             print(f"Test Response Status: {response.status_code}")
             print("Test Response Body (first 1000 chars):")
             print(response.text[:1000] + "...") # Print only the start of the list
@@ -62,13 +178,9 @@ class AvatarVideoGenerator:
     def test_api_key(self):
         """Tests the API key by trying to list available avatars."""
         test_url = "https://api.heygen.com/v2/avatars"
-        headers = {
-            "x-api-key": self.api_key,
-            "accept": "application/json"
-        }
         print(f"🔬 Testing API key with GET request to: {test_url}")
         try:
-            response = requests.get(test_url, headers=headers, timeout=10)
+            response = self.avatars
             print(f"Test Response Status: {response.status_code}")
             print("Test Response Body:")
             print(response.text)
@@ -85,19 +197,12 @@ class AvatarVideoGenerator:
             print(f"⚠️  No API key provided. Creating mock response for segment {segment_id}")
             return self._create_mock_response(segment_id, script)
         
-        headers = {
-            "x-api-key": self.api_key,       # Use lowercase 'x-api-key'
-            "Content-Type": "application/json",
-            "accept": "application/json"  # Add this line
-        }
-        print("headers", headers)
-
 
         payload = {
             "video_inputs": [{
                 # "character": {
                 #     "type": "avatar",
-                #     "avatar_id": self.avatar_configs["heygen"]["avatar_id"],
+                #     "avatar_id": self.cfg.avatar_id,
                 #     "avatar_style": "normal"
                 # },
                 "character": {
@@ -109,7 +214,7 @@ class AvatarVideoGenerator:
                 "voice": {
                     "type": "text",
                     "input_text": script,
-                    "voice_id": self.avatar_configs["heygen"]["voice_id"]
+                    "voice_id": self.cfg.voice_id
                 },
                 # "background": {
                 #     "type": "color",
@@ -126,9 +231,8 @@ class AvatarVideoGenerator:
         print("[ayload]", payload)
 
         try:
-            response = requests.post(
-                self.endpoints["heygen"]["create"],
-                headers=headers,
+            response = self.create_session.post(
+                self.cfg.create_url,
                 json=payload,
                 timeout=30
             )
@@ -145,7 +249,7 @@ class AvatarVideoGenerator:
         
         except Exception as e:
             print(f"❌ Error creating HeyGen video: {e}")
-            return self._create_mock_response(segment_id, script)
+            return self._create_failed_response(segment_id, e)
     
     def create_avatar_video_did(self, script: str, segment_id: int) -> Dict:
         """Create video using D-ID API"""
@@ -154,31 +258,25 @@ class AvatarVideoGenerator:
             print(f"⚠️  No API key provided. Creating mock response for segment {segment_id}")
             return self._create_mock_response(segment_id, script)
         
-        headers = {
-            "Authorization": f"Basic {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "script": {
                 "type": "text",
                 "input": script,
                 "provider": {
                     "type": "microsoft",
-                    "voice_id": self.avatar_configs["d-id"]["voice_id"]
+                    "voice_id": self.cfg.voice_id
                 }
             },
             "config": {
                 "fluent": True,
                 "pad_audio": 0
             },
-            "source_url": f"https://create-images-results.d-id.com/DefaultPresenters/{self.avatar_configs['d-id']['presenter_id']}/image.png"
+            "source_url": DID_PRESENTER_URL
         }
         
         try:
-            response = requests.post(
-                self.endpoints["d-id"]["create"],
-                headers=headers,
+            response = self.create_session.post(
+                self.cfg.create_url,
                 json=payload,
                 timeout=30
             )
@@ -194,7 +292,7 @@ class AvatarVideoGenerator:
         
         except Exception as e:
             print(f"❌ Error creating D-ID video: {e}")
-            return self._create_mock_response(segment_id, script)
+            return self._create_failed_response(segment_id, e)
     
     def _create_mock_response(self, segment_id: int, script: str) -> Dict:
         """Create mock response for testing without API"""
@@ -207,6 +305,16 @@ class AvatarVideoGenerator:
             "duration": len(script.split()) * 0.4  # Estimate ~0.4 sec per word
         }
     
+    def _create_failed_response(self, segment_id: int, error: Exception) -> Dict:
+        """Task for a create request the provider rejected; it is reported, not polled"""
+        return {
+            "provider": self.provider,
+            "video_id": None,
+            "status": "error",
+            "segment_id": segment_id,
+            "error": str(error)
+        }
+    
     def check_video_status(self, video_id: str, provider: str = None) -> Dict:
         """Check the status of video generation"""
         
@@ -221,21 +329,21 @@ class AvatarVideoGenerator:
         if not self.api_key:
             return {"status": "completed", "video_url": f"mock_{video_id}.mp4"}
         
-        if provider == "heygen":
-            headers = {"x-Api-Key": self.api_key}
-            response = requests.get(
-                self.endpoints["heygen"]["status"],
-                headers=headers,
-                params={"video_id": video_id},
-                timeout=30
-            )
-            
-        elif provider == "d-id":
-            headers = {"Authorization": f"Basic {self.api_key}"}
-            url = self.endpoints["d-id"]["status"].format(talk_id=video_id)
-            response = requests.get(url, headers=headers, timeout=30)
-        
         try:
+            # Called from polling worker threads, so request errors must be
+            # reported as a status rather than raised
+            cfg = PROVIDER_CONFIGS[provider]
+            if provider == "heygen":
+                response = self.session.get(
+                    cfg.status_url,
+                    params={"video_id": video_id},
+                    timeout=30
+                )
+                
+            elif provider == "d-id":
+                url = cfg.status_url.format(talk_id=video_id)
+                response = self.session.get(url, timeout=30)
+            
             response.raise_for_status()
             result = response.json()
             
@@ -254,6 +362,59 @@ class AvatarVideoGenerator:
             print(f"❌ Error checking status: {e}")
             return {"status": "error", "video_url": None}
     
+    def _create_task(self, segment: Dict) -> Dict:
+        """Submit a single segment to the configured provider (run in a worker thread)"""
+        print(f"Creating video for Segment {segment['id']}: {segment['type']}")
+        print(f"Script length: {len(segment['script'])} characters")
+        
+        if self.provider == "heygen":
+            task = self.create_avatar_video_heygen(
+                segment['script'], 
+                segment['id']
+            )
+        elif self.provider == "d-id":
+            task = self.create_avatar_video_did(
+                segment['script'],
+                segment['id']
+            )
+        else:
+            task = self._create_mock_response(segment['id'], segment['script'])
+        
+        if task['status'] != "error":
+            print(f"✅ Video task created: {task['video_id']}\n")
+        return task
+    
+    # Polling state handlers, dispatched on the status reported for a task.
+    # Each receives the task, its status info, the pending_tasks dict and the
+    # list of (task, video_url) pairs to download at the end of the tick.
+    
+    def _on_completed(self, task, status_info, pending_tasks, to_download):
+        if not status_info['video_url']:
+            self._on_unknown_status(task, status_info, pending_tasks, to_download)
+            return
+        print(f"✅ Segment {task['segment_id']} completed!")
+        to_download.append((task, status_info['video_url']))
+        pending_tasks.pop(task['segment_id']) # This task is done
+    
+    def _on_error(self, task, status_info, pending_tasks, to_download):
+        print(f"❌ Segment {task['segment_id']} failed to generate.")
+        pending_tasks.pop(task['segment_id']) # This task is also done (it failed)
+    
+    def _on_pending(self, task, status_info, pending_tasks, to_download):
+        print(f"⏳ Segment {task['segment_id']}: Still {status_info['status']}...")
+    
+    def _on_unknown_status(self, task, status_info, pending_tasks, to_download):
+        print(f"⚠️ Segment {task['segment_id']}: Unknown status '{status_info['status']}'")
+    
+    def _check_task_status(self, task: Dict) -> Dict:
+        """Check the status of a single video task (run in a worker thread)"""
+        return self.check_video_status(task['video_id'], task['provider'])
+    
+    def _download_task(self, item) -> str:
+        """Download the video for a (task, video_url) pair (run in a worker thread)"""
+        task, video_url = item
+        return self.download_video(video_url, f"segment_{task['segment_id']}.mp4")
+    
     def download_video(self, video_url: str, filename: str) -> str:
         """Download the generated video"""
         
@@ -265,12 +426,28 @@ class AvatarVideoGenerator:
             return filepath
         
         try:
-            response = requests.get(video_url, stream=True, timeout=60)
+            filepath = os.path.join(self.output_dir, filename)
+            
+            if self.download_client is not None:
+                # HTTP/2: parallel segment downloads share one multiplexed connection
+                with self.download_client.stream("GET", video_url) as response:
+                    response.raise_for_status()
+                    with open(filepath, 'wb') as f:
+                        for chunk in response.iter_bytes(chunk_size=1 << 20):
+                            f.write(chunk)
+                return filepath
+            
+            # Video URLs point at a third-party CDN, so strip the API auth headers
+            response = self.session.get(
+                video_url,
+                stream=True,
+                timeout=60,
+                headers={"x-api-key": None, "Authorization": None}
+            )
             response.raise_for_status()
             
-            filepath = os.path.join(self.output_dir, filename)
             with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+                for chunk in response.iter_content(chunk_size=1 << 20):
                     f.write(chunk)
             
             return filepath
@@ -280,120 +457,110 @@ class AvatarVideoGenerator:
             return None
     
     def generate_commentary_videos(self, segments: List[Dict]) -> List[Dict]:
-            """
-            Generate avatar videos for all commentary segments
-            """
-            
-            video_tasks = []
-            
+        """
+        Generate avatar videos for all commentary segments
+        The HTTP connections are closed afterwards; a later call reopens them
+        """
+        if self.download_client is None:
+            self.download_client = self._create_download_client()
+        try:
+            return self._generate_commentary_videos(segments)
+        finally:
+            self.close()
+    
+    def _generate_commentary_videos(self, segments: List[Dict]) -> List[Dict]:
             print(f"\n🎬 Generating avatar videos using {self.provider.upper()}...\n")
             
-            # 1. Create all video tasks first
-            for segment in segments:
-                print(f"Creating video for Segment {segment['id']}: {segment['type']}")
-                print(f"Script length: {len(segment['script'])} characters")
-                
-                if self.provider == "heygen":
-                    task = self.create_avatar_video_heygen(
-                        segment['script'], 
-                        segment['id']
-                    )
-                elif self.provider == "d-id":
-                    task = self.create_avatar_video_did(
-                        segment['script'],
-                        segment['id']
-                    )
-                else:
-                    task = self._create_mock_response(segment['id'], segment['script'])
-                
-                video_tasks.append(task)
-                print(f"✅ Video task created: {task['video_id']}\n")
-                
-                # Small delay to avoid rate limiting
-                time.sleep(1)
+            # 1. Create all video tasks first, a few at a time. The small
+            # worker pool (rather than a sleep between calls) keeps us under
+            # the provider's rate limit.
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_creates) as executor:
+                video_tasks = list(executor.map(self._create_task, segments))
             
             # 2. Wait for all videos to complete using parallel polling
             print("⏳ Waiting for videos to generate...\n")
             
             completed_videos = []
-            pending_tasks = list(video_tasks)  # Create a copy of the list to manage
+            pending_tasks = {}  # segment_id -> task
+            
+            for task in video_tasks:
+                # Mock tasks are complete as soon as they are created, so
+                # resolve them now instead of sending them through polling
+                if task['provider'] == 'mock':
+                    print(f"✅ Segment {task['segment_id']} completed (mock)")
+                    filepath = os.path.join(self.output_dir, f"segment_{task['segment_id']}.mp4")
+                    with open(filepath, 'w') as f:
+                        f.write(f"Mock video for segment {task['segment_id']}")
+                    
+                    completed_videos.append({
+                        "segment_id": task['segment_id'],
+                        "video_id": task['video_id'],
+                        "provider": task['provider'],
+                        "status": "completed",
+                        "local_path": filepath
+                    })
+                elif task['status'] == "error":
+                    print(f"❌ Segment {task['segment_id']} could not be created: {task['error']}")
+                else:
+                    pending_tasks[task['segment_id']] = task
             
-            max_attempts = 60  # Wait up to 15 minutes (180 * 5s = 900s)
+            max_wait = 900  # Wait up to 15 minutes in total
+            deadline = time.monotonic() + max_wait
             attempt = 0
+            
+            # Poll quickly at first, then back off while nothing changes
+            min_delay, max_delay = 2, 15
+            delay = min_delay
+            last_status = {}
 
-            while pending_tasks and attempt < max_attempts:
-                attempt += 1
-                print(f"--- Polling attempt {attempt}/{max_attempts} ---")
-                
-                # We must iterate over a copy of the list (tasks_to_check)
-                # because we will be removing items from the original (pending_tasks)
-                tasks_to_check = list(pending_tasks)
-                
-                for task in tasks_to_check:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while pending_tasks and time.monotonic() < deadline:
+                    attempt += 1
+                    print(f"--- Polling attempt {attempt} ---")
                     
-                    # Handle mock provider
-                    if task['provider'] == 'mock':
-                        print(f"✅ Segment {task['segment_id']} completed (mock)")
-                        filepath = os.path.join(self.output_dir, f"segment_{task['segment_id']}.mp4")
-                        with open(filepath, 'w') as f:
-                            f.write(f"Mock video for segment {task['segment_id']}")
-                        
-                        completed_videos.append({
-                            "segment_id": task['segment_id'],
-                            "video_id": task['video_id'],
-                            "status": "completed",
-                            "local_path": filepath
-                        })
-                        pending_tasks.remove(task) # This task is done
-                        continue # Go to the next task
+                    # Snapshot the pending tasks, since finished ones are
+                    # popped from pending_tasks while we iterate
+                    tasks_to_check = list(pending_tasks.values())
+                    
+                    # Issue every status check at once; map() yields results in task order
+                    status_results = executor.map(self._check_task_status, tasks_to_check)
                     
-                    # Handle real API
-                    status_info = self.check_video_status(
-                        task['video_id'],
-                        task['provider']
-                    )
+                    to_download = []
+                    status_changed = False
                     
-                    if status_info['status'] == 'completed' and status_info['video_url']:
-                        print(f"✅ Segment {task['segment_id']} completed!")
+                    for task, status_info in zip(tasks_to_check, status_results):
                         
-                        # Download video
-                        filename = f"segment_{task['segment_id']}.mp4"
-                        local_path = self.download_video(
-                            status_info['video_url'],
-                            filename
-                        )
+                        if last_status.get(task['segment_id']) != status_info['status']:
+                            last_status[task['segment_id']] = status_info['status']
+                            status_changed = True
                         
+                        handler = self._status_handlers.get(status_info['status'], self._on_unknown_status)
+                        handler(task, status_info, pending_tasks, to_download)
+
+                    # Download every video that finished this tick in parallel
+                    local_paths = executor.map(self._download_task, to_download)
+                    
+                    for (task, _), local_path in zip(to_download, local_paths):
                         if local_path:
                             completed_videos.append({
                                 "segment_id": task['segment_id'],
                                 "video_id": task['video_id'],
+                                "provider": task['provider'],
                                 "status": "completed",
                                 "local_path": local_path
                             })
                         else:
                             print(f"❌ Segment {task['segment_id']} completed but download failed.")
-                        
-                        pending_tasks.remove(task) # This task is done
-                    
-                    elif status_info['status'] == 'error':
-                        print(f"❌ Segment {task['segment_id']} failed to generate.")
-                        pending_tasks.remove(task) # This task is also done (it failed)
                     
-                    elif status_info['status'] == 'processing' or status_info['status'] == 'pending':
-                        print(f"⏳ Segment {task['segment_id']}: Still {status_info['status']}...")
-                    
-                    else:
-                        # Handle any other unexpected status
-                        print(f"⚠️ Segment {task['segment_id']}: Unknown status '{status_info['status']}'")
-
-                # Don't sleep if all tasks are done
-                if pending_tasks:
-                    time.sleep(5)  # Wait 5 seconds before polling ALL tasks again
+                    # Don't sleep if all tasks are done
+                    if pending_tasks:
+                        delay = min_delay if status_changed else min(max_delay, delay * 1.5)
+                        time.sleep(delay)
 
             # After the loop, check if any tasks timed out
             if pending_tasks:
                 print(f"\n❌ Timed out waiting for {len(pending_tasks)} video(s):")
-                for task in pending_tasks:
+                for task in pending_tasks.values():
                     print(f"  - Segment {task['segment_id']} (Video ID: {task['video_id']})")
             
             return completed_videos
@@ -402,8 +569,7 @@ class AvatarVideoGenerator:
 # Usage Example
 if __name__ == "__main__":
     # Load commentary script
-    with open('commentary_script.json', 'r') as f:
-        data = json.load(f)
+    data = load_json('commentary_script.json')
     
     segments = data['segments']
 
@@ -441,8 +607,7 @@ if __name__ == "__main__":
         print(f"  Segment {video['segment_id']}: {video['local_path']}")
     
     # Save video info for final composition
-    with open('avatar_videos.json', 'w') as f:
-        json.dump(completed_videos, f, indent=2)
+    dump_json(completed_videos, 'avatar_videos.json')
     
     print("\n💡 API Integration Notes:")
     print("   HeyGen: https://docs.heygen.com/")
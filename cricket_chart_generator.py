@@ -1,17 +1,92 @@
+import matplotlib
+matplotlib.use("Agg")  # Headless rendering; must be set before pyplot is imported
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import numpy as np
 from PIL import Image
-import json
+import multiprocessing
 import os
-import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+from matplotlib.collections import LineCollection
 from matplotlib.lines import Line2D
 
+from json_utils import load_json, dump_json
+
+
+def run_rate_curve(runs, overs):
+    """Cumulative run rate after each over, computed over whole arrays at once"""
+    runs = np.asarray(runs, dtype=np.float64)
+    overs = np.asarray(overs, dtype=np.float64)
+    totals = np.cumsum(runs)
+    # An over number of 0 has no defined rate; leave it at 0 instead of inf
+    return np.divide(totals, overs, out=np.zeros_like(totals), where=overs > 0)
+
+
+def _encode_and_write(path, pixels, fmt, pil_kwargs):
+    """Encode a rendered RGBA chart as PNG/JPEG and write it to disk"""
+    image = Image.fromarray(pixels)
+    if fmt in ("jpg", "jpeg"):
+        image, fmt = image.convert("RGB"), "jpeg"
+    image.save(path, format=fmt, **pil_kwargs)
+    return path
+
+
 class CricketChartGenerator:
-    def __init__(self, output_dir="cricket_charts"):
-        """Initialize chart generator with output directory"""
+    # Fixed margins per chart (matching what tight_layout() produced for
+    # these fixed-size figures), so no layout solver runs per chart
+    _LAYOUTS = {
+        'run_rate': dict(left=0.06, right=0.98, top=0.89, bottom=0.11),
+        'manhattan': dict(left=0.055, right=0.985, top=0.89, bottom=0.11),
+        'wagon_wheel': dict(left=0.02, right=0.98, top=0.93, bottom=0.02),
+        'partnership': dict(left=0.06, right=0.88, top=0.89, bottom=0.11),
+    }
+    
+    # Wagon-wheel angle (degrees) for each fielding region, in match priority order
+    _REGION_ANGLES = (
+        ("midwicket", 135),
+        ("covers", 75),
+        ("long-on", 180),
+        ("long-off", 350),
+        ("point", 50),
+        ("square leg", 110),
+    )
+    
+    # Chart name -> (generator method, label)
+    CHART_TYPES = {
+        'run_rate': ('generate_run_rate_graph', 'Run Rate Graph'),
+        'manhattan': ('generate_manhattan_chart', 'Manhattan Chart'),
+        'wagon_wheel': ('generate_wagon_wheel', 'Wagon Wheel'),
+        'partnership': ('generate_partnership_chart', 'Partnership Chart'),
+    }
+    # Charts drawn from recent_overs, which accept a precomputed overs_array()
+    _OVERS_CHARTS = {'run_rate', 'manhattan'}
+    
+    # Structure-of-arrays layout for match_data['recent_overs']
+    OVERS_DTYPE = np.dtype([("over", "f8"), ("runs", "i8")])
+    
+    def __init__(self, output_dir="cricket_charts", dpi=100, fmt="png", max_workers=4,
+                 seed=None, defer_write=False):
+        """
+        Initialize chart generator with output directory
+        dpi/fmt: resolution and image format ('png' or 'jpg') of saved charts.
+        Charts are scaled down when overlaid on video, so 100 dpi is plenty.
+        max_workers: processes used by generate_all_charts (1 = render in-process)
+        seed: optional seed for reproducible wagon-wheel shot directions
+        defer_write: only with max_workers=1. Charts are rasterised inline, but
+        encoding and writing the image files happens on background threads,
+        overlapping the next chart and whatever the caller does next. Call
+        flush_writes() before reading the files
+        """
         self.output_dir = output_dir
+        self.dpi = dpi
+        self.fmt = fmt
+        self.max_workers = max_workers
+        self._rng = np.random.default_rng(seed)
+        self.defer_write = defer_write
+        self._pending_writes = []
+        self._writer = None
+        self._write_futures = []
         os.makedirs(output_dir, exist_ok=True)
         
         # Set style for professional look
@@ -23,24 +98,109 @@ class CricketChartGenerator:
             'success': '#2ECC71',
             'background': '#1C1C1C'
         }
+        
+        # One Figure per chart size, reused across charts and matches.
+        # Creating a Figure is far more expensive than clearing its Axes.
+        # Not thread-safe: the generator is meant to be used from one thread.
+        self._figures = {}
+    
+    def __getstate__(self):
+        # Figures are per-process; worker processes build their own
+        state = self.__dict__.copy()
+        state['_figures'] = {}
+        # Worker processes already write in parallel with each other
+        state['defer_write'] = False
+        state['_pending_writes'] = []
+        state['_writer'] = None
+        state['_write_futures'] = []
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Spawned workers don't inherit the style set in __init__
+        plt.style.use('dark_background')
+    
+    def _get_axes(self, figsize, chart):
+        """Return a cleared (fig, ax) pair of the given size, laid out for `chart`"""
+        if figsize not in self._figures:
+            self._figures[figsize] = plt.subplots(
+                figsize=figsize, facecolor=self.colors['background']
+            )
+        fig, ax = self._figures[figsize]
+        ax.clear()
+        fig.subplots_adjust(**self._LAYOUTS[chart])
+        return fig, ax
     
-    def generate_run_rate_graph(self, match_data, filename="run_rate.png"):
-        """Generate run rate comparison graph using match_data"""
+    def _save(self, fig, filename):
+        """Save fig into the output directory with the configured dpi and format"""
+        filepath = os.path.join(self.output_dir, filename)
+        if self.fmt in ("jpg", "jpeg"):
+            pil_kwargs = {"quality": 85}
+        else:
+            # Charts are re-encoded into video downstream, so favour encode
+            # speed over file size
+            pil_kwargs = {"compress_level": 1}
+        
+        if self.defer_write:
+            # Rasterise now, since the Figure is reused for the next chart;
+            # the encode and write are left to the writer threads
+            fig.set_dpi(self.dpi)
+            fig.canvas.draw()
+            pixels = np.asarray(fig.canvas.buffer_rgba()).copy()
+            self._pending_writes.append((filepath, pixels, self.fmt, pil_kwargs))
+            return filepath
+        
+        fig.savefig(filepath, dpi=self.dpi, format=self.fmt,
+                    facecolor=self.colors['background'], pil_kwargs=pil_kwargs)
+        return filepath
+    
+    def _submit_writes(self):
+        """Start encoding and writing the rendered charts in the background"""
+        if not self._pending_writes:
+            return
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=4)
+        pending, self._pending_writes = self._pending_writes, []
+        self._write_futures += [self._writer.submit(_encode_and_write, *item) for item in pending]
+    
+    def flush_writes(self):
+        """Wait until every deferred chart file is on disk"""
+        self._submit_writes()
+        futures, self._write_futures = self._write_futures, []
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            if self._writer is not None:
+                self._writer.shutdown()
+                self._writer = None
+    
+    def close(self):
+        """Release the cached figures"""
+        for fig, _ in self._figures.values():
+            plt.close(fig)
+        self._figures.clear()
+    
+    def generate_run_rate_graph(self, match_data, filename=None, overs_data=None):
+        """
+        Generate run rate comparison graph using match_data
+        overs_data: optional precomputed overs_array(match_data)
+        """
 
-        fig, ax = plt.subplots(figsize=(12, 6), facecolor=self.colors['background'])
+        fig, ax = self._get_axes((12, 6), 'run_rate')
         ax.set_facecolor('#2C2C2C')
 
-        # Extract overs and cumulative runs from recent_overs
-        recent_overs = match_data.get("recent_overs", [])
-        overs = [over_data["over"] for over_data in recent_overs]
-        runs = [over_data["runs"] for over_data in recent_overs]
+        # Overs and runs columns from recent_overs
+        if overs_data is None:
+            overs_data = self.overs_array(match_data)
+        overs = overs_data["over"]
+        runs = overs_data["runs"]
 
-        # Compute cumulative runs for current run rate calculation
-        cumulative_runs = np.cumsum(runs).tolist()
-        current_rr = [cumulative_runs[i] / overs[i] for i in range(len(overs))]
+        # Current run rate from cumulative runs, kept as arrays throughout
+        current_rr = run_rate_curve(runs, overs)
 
         # Required run rate (constant from JSON)
-        required_rr = [match_data["run_rate"]["required"]] * len(overs)
+        required_rr = np.full_like(overs, match_data["run_rate"]["required"])
 
         # Plot lines
         ax.plot(overs, current_rr, color=self.colors['primary'], 
@@ -50,10 +210,10 @@ class CricketChartGenerator:
 
         # Fill area between lines
         ax.fill_between(overs, current_rr, required_rr, 
-                        where=(np.array(current_rr) >= np.array(required_rr)),
+                        where=(current_rr >= required_rr),
                         alpha=0.3, color=self.colors['success'], label='Ahead')
         ax.fill_between(overs, current_rr, required_rr,
-                        where=(np.array(current_rr) < np.array(required_rr)),
+                        where=(current_rr < required_rr),
                         alpha=0.3, color=self.colors['accent'], label='Behind')
 
         # Styling
@@ -74,34 +234,29 @@ class CricketChartGenerator:
                 color=self.colors['secondary'], ha='right', va='top',
                 bbox=dict(boxstyle='round', facecolor='black', alpha=0.7))
 
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=150, facecolor=self.colors['background'])
-        plt.close()
+        filepath = self._save(fig, filename or f"run_rate.{self.fmt}")
 
         return filepath
 
     
-    def generate_manhattan_chart(self, match_data, filename="manhattan.png"):
-        """Generate Manhattan (runs per over) chart using match_data"""
+    def generate_manhattan_chart(self, match_data, filename=None, overs_data=None):
+        """
+        Generate Manhattan (runs per over) chart using match_data
+        overs_data: optional precomputed overs_array(match_data)
+        """
 
-        fig, ax = plt.subplots(figsize=(14, 6), facecolor=self.colors['background'])
+        fig, ax = self._get_axes((14, 6), 'manhattan')
         ax.set_facecolor('#2C2C2C')
 
-        # Extract overs & runs from match_data
-        recent_overs = match_data.get("recent_overs", [])
-        overs = [over_data["over"] for over_data in recent_overs]
-        runs_per_over = [over_data["runs"] for over_data in recent_overs]
-
-        # Color code: green for good overs (10+), yellow for medium, red for low
-        colors_list = []
-        for runs in runs_per_over:
-            if runs >= 10:
-                colors_list.append(self.colors['success'])
-            elif runs >= 7:
-                colors_list.append(self.colors['secondary'])
-            else:
-                colors_list.append(self.colors['accent'])
+        # Overs and runs columns from recent_overs
+        if overs_data is None:
+            overs_data = self.overs_array(match_data)
+        overs = overs_data["over"]
+        runs_per_over = overs_data["runs"]
+
+        # Color code: green for good overs (10+), yellow for medium (7+), red for low
+        palette = np.array([self.colors['accent'], self.colors['secondary'], self.colors['success']])
+        colors_list = palette[np.digitize(runs_per_over, [7, 10])]
 
         # Create bars
         bars = ax.bar(overs, runs_per_over, color=colors_list, 
@@ -127,22 +282,19 @@ class CricketChartGenerator:
         ax.grid(True, axis='y', alpha=0.2, linestyle='--')
 
         # Add average line
-        if runs_per_over:  # avoid error on empty data
-            avg_runs = np.mean(runs_per_over)
+        if runs_per_over.size:  # avoid error on empty data
+            avg_runs = runs_per_over.mean()
             ax.axhline(y=avg_runs, color=self.colors['primary'], 
                     linestyle='--', linewidth=2, label=f'Average: {avg_runs:.1f}')
             ax.legend(loc='upper right', fontsize=11, framealpha=0.9)
 
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=150, facecolor=self.colors['background'])
-        plt.close()
+        filepath = self._save(fig, filename or f"manhattan.{self.fmt}")
 
         return filepath
 
     
-    def generate_wagon_wheel(self, match_data, filename="wagon_wheel.png"):
-        fig, ax = plt.subplots(figsize=(10, 10), facecolor=self.colors['background'])
+    def generate_wagon_wheel(self, match_data, filename=None):
+        fig, ax = self._get_axes((10, 10), 'wagon_wheel')
         ax.set_facecolor('#2C2C2C')
         
         field = patches.Circle((0, 0), 1, fill=False, edgecolor='white', linewidth=2)
@@ -153,17 +305,17 @@ class CricketChartGenerator:
 
         # Extract from key moments
         shots = []
-        for moment in match_data.get("key_moments", []):
+        key_moments = match_data.get("key_moments", [])
+        # Draw all fallback directions up front in one call
+        fallback_angles = self._rng.integers(0, 360, size=len(key_moments))
+        for moment, fallback_angle in zip(key_moments, fallback_angles):
             desc = moment.get("description", "").lower()
             runs = moment.get("runs", 0)
 
-            angle = random.randint(0, 360)
-            if "midwicket" in desc: angle = 135
-            elif "covers" in desc: angle = 75
-            elif "long-on" in desc: angle = 180
-            elif "long-off" in desc: angle = 350
-            elif "point" in desc: angle = 50
-            elif "square leg" in desc: angle = 110
+            # First matching fielding region wins; random direction otherwise
+            angle = next((a for region, a in self._REGION_ANGLES if region in desc), None)
+            if angle is None:
+                angle = int(fallback_angle)
 
             distance = 0.7
             if runs == 6: distance = 0.95
@@ -174,19 +326,29 @@ class CricketChartGenerator:
             if moment.get("type") == "wicket":
                 shots.append((angle, 0.85, -1))  # mark wicket
 
-        for angle, distance, runs in shots:
-            x, y = distance*np.cos(np.radians(angle)), distance*np.sin(np.radians(angle))
-            if runs == 6:
-                color, marker, size = self.colors['accent'], '*', 200
-            elif runs == 4:
-                color, marker, size = self.colors['success'], 'o', 150
-            elif runs == -1:
-                color, marker, size = self.colors['secondary'], 'X', 180
-            else:
-                color, marker, size = self.colors['secondary'], 'o', 100
-
-            ax.plot([0, x], [0, y], color=color, linewidth=2, alpha=0.6)
-            ax.scatter(x, y, s=size, c=color, marker=marker, edgecolor='white', linewidth=1, zorder=5)
+        # Group shots by marker style so each class is drawn with a single
+        # scatter call, and put every radial line into one LineCollection
+        shot_styles = {
+            6: (self.colors['accent'], '*', 200),
+            4: (self.colors['success'], 'o', 150),
+            -1: (self.colors['secondary'], 'X', 180),
+        }
+        default_style = (self.colors['secondary'], 'o', 100)
+
+        # Shot end points in one vectorized pass over all angles
+        shots_arr = np.asarray(shots, dtype=float).reshape(-1, 3)
+        angles = np.deg2rad(shots_arr[:, 0])
+        xy = shots_arr[:, 1:2] * np.column_stack((np.cos(angles), np.sin(angles)))
+        styles = [shot_styles.get(runs, default_style) for runs in shots_arr[:, 2].astype(int).tolist()]
+
+        segments = np.stack((np.zeros_like(xy), xy), axis=1)  # Lines from the origin
+        ax.add_collection(LineCollection(segments, colors=[style[0] for style in styles],
+                                         linewidths=2, alpha=0.6))
+        for style in dict.fromkeys(styles):
+            color, marker, size = style
+            mask = np.fromiter((s == style for s in styles), dtype=bool, count=len(styles))
+            ax.scatter(xy[mask, 0], xy[mask, 1], s=size, c=color, marker=marker,
+                       edgecolor='white', linewidth=1, zorder=5)
 
         ax.set_xlim(-1.2, 1.2)
         ax.set_ylim(-1.2, 1.2)
@@ -201,14 +363,11 @@ class CricketChartGenerator:
         ]
         ax.legend(handles=legend_elements, loc='upper left', fontsize=11, framealpha=0.9)
 
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=150, facecolor=self.colors['background'])
-        plt.close()
+        filepath = self._save(fig, filename or f"wagon_wheel.{self.fmt}")
         return filepath
 
-    def generate_partnership_chart(self, match_data, filename="partnership.png"):
-        fig, ax = plt.subplots(figsize=(12, 6), facecolor=self.colors['background'])
+    def generate_partnership_chart(self, match_data, filename=None):
+        fig, ax = self._get_axes((12, 6), 'partnership')
         ax.set_facecolor('#2C2C2C')
 
         partnership = match_data.get('partnerships', [])[0]
@@ -231,13 +390,26 @@ class CricketChartGenerator:
         ax.grid(True, alpha=0.2, linestyle='--')
         ax.tick_params(colors='white', labelsize=10)
 
-        plt.tight_layout()
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=150, facecolor=self.colors['background'])
-        plt.close()
+        filepath = self._save(fig, filename or f"partnership.{self.fmt}")
         return filepath
 
     
+    @classmethod
+    def overs_array(cls, match_data):
+        """Convert match_data['recent_overs'] into a structured (over, runs) array"""
+        recent_overs = match_data.get("recent_overs", [])
+        return np.fromiter(
+            ((over_data["over"], over_data["runs"]) for over_data in recent_overs),
+            dtype=cls.OVERS_DTYPE, count=len(recent_overs)
+        )
+    
+    def render_chart(self, chart_type, match_data, overs_data=None):
+        """Render a single chart by name (also the entry point for worker processes)"""
+        method_name, _ = self.CHART_TYPES[chart_type]
+        if chart_type in self._OVERS_CHARTS:
+            return getattr(self, method_name)(match_data, overs_data=overs_data)
+        return getattr(self, method_name)(match_data)
+    
     def generate_all_charts(self, match_data):
         """Generate all charts for the match"""
         
@@ -245,17 +417,31 @@ class CricketChartGenerator:
         
         print("🎨 Generating charts...")
         
-        charts['run_rate'] = self.generate_run_rate_graph(match_data)
-        print(f"✅ Run Rate Graph: {charts['run_rate']}")
-        
-        charts['manhattan'] = self.generate_manhattan_chart(match_data)
-        print(f"✅ Manhattan Chart: {charts['manhattan']}")
+        # Shared by the run rate and Manhattan charts, so build it once
+        overs_data = self.overs_array(match_data)
         
-        charts['wagon_wheel'] = self.generate_wagon_wheel(match_data)
-        print(f"✅ Wagon Wheel: {charts['wagon_wheel']}")
+        if self.max_workers <= 1:
+            # With defer_write, each chart is encoded and written in the
+            # background while the next one renders; the caller flushes
+            for chart_type, (_, label) in self.CHART_TYPES.items():
+                charts[chart_type] = self.render_chart(chart_type, match_data, overs_data)
+                self._submit_writes()
+                print(f"✅ {label}: {charts[chart_type]}")
+            return charts
         
-        charts['partnership'] = self.generate_partnership_chart(match_data)
-        print(f"✅ Partnership Chart: {charts['partnership']}")
+        # Charts are CPU-bound and independent (each writes its own file),
+        # so render them in separate processes to sidestep the GIL. Workers are
+        # spawned, not forked: the pipeline may have other threads mid-request,
+        # and a forked child can inherit their locks held
+        with ProcessPoolExecutor(max_workers=self.max_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                chart_type: executor.submit(self.render_chart, chart_type, match_data, overs_data)
+                for chart_type in self.CHART_TYPES
+            }
+            for chart_type, future in futures.items():
+                charts[chart_type] = future.result()
+                print(f"✅ {self.CHART_TYPES[chart_type][1]}: {charts[chart_type]}")
         
         return charts
 
@@ -263,8 +449,7 @@ class CricketChartGenerator:
 # Usage Example
 if __name__ == "__main__":
     # Load match data
-    with open('commentary_script.json', 'r') as f:
-        data = json.load(f)
+    data = load_json('commentary_script.json')
     
     match_data = data['match_data']
     print("match data using ", match_data)
@@ -284,5 +469,4 @@ if __name__ == "__main__":
     print("=" * 60)
     
     # Save chart paths for next step
-    with open('chart_paths.json', 'w') as f:
-        json.dump(charts, f, indent=2)
\ No newline at end of file
+    dump_json(charts, 'chart_paths.json')
\ No newline at end of file
@@ -1,7 +1,11 @@
 import subprocess
-import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
 from typing import List, Dict
+from json_utils import load_json
 
 class VideoComposer:
     """
@@ -9,38 +13,194 @@ class VideoComposer:
     Combines avatar videos, charts, transitions, and audio
     """
     
-    def __init__(self, output_filename="cricket_commentary_final.mp4"):
+    # Hardware H.264 encoders in order of preference, with their quality settings
+    HW_ENCODERS = {
+        "h264_nvenc": ['-preset', 'p4', '-tune', 'hq', '-rc', 'vbr', '-cq', '23', '-b:v', '6M'],
+        "h264_qsv": ['-preset', 'veryfast', '-global_quality', '23'],
+        "h264_videotoolbox": ['-q:v', '65']
+    }
+    DEFAULT_X264_PRESET = "veryfast"
+    SOFTWARE_ENCODER_ARGS = ['-preset', DEFAULT_X264_PRESET]
+    # x264 presets from fastest/largest to slowest/smallest
+    X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast",
+                    "medium", "slow", "slower", "veryslow")
+    
+    # Bold fonts passed to drawtext directly, so ffmpeg skips the FontConfig lookup
+    FONT_CANDIDATES = [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+        "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
+        "C:/Windows/Fonts/arialbd.ttf"
+    ]
+    
+    # FFmpeg capabilities don't change while we run, so they are probed once
+    # per process and shared by every composer instance
+    _encoder_listing = None
+    _hw_encoder = None
+    _hw_encoder_probed = False
+    
+    def __init__(self, output_filename="cricket_commentary_final.mp4", max_workers=None,
+                 compose_strategy="split", encoder_preset=DEFAULT_X264_PRESET, crf=None):
+        """
+        compose_strategy: 'split' encodes segments in parallel and stitches them
+        with a stream-copy concat; 'one_shot' renders the whole video in a single
+        ffmpeg process
+        encoder_preset/crf: x264 speed preset and constant quality used when no
+        hardware encoder is available (defaults: DEFAULT_X264_PRESET, x264's own crf 23)
+        """
         self.output_filename = output_filename
-        self.temp_dir = "temp_video_files"
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.compose_strategy = compose_strategy
+        self.temp_dir = Path("temp_video_files").resolve()
+        self.temp_dir.mkdir(exist_ok=True)
         
         # Video settings
         self.resolution = "1920x1080"
         self.fps = 30
         self.audio_codec = "aac"
         self.video_codec = "libx264"
+        self._duration_cache = {}
+        self._audio_cache = {}
+        self.cuda_filters = True
+        self._segment_templates = {}
+        
+        if encoder_preset and encoder_preset not in self.X264_PRESETS:
+            raise ValueError(f"Unknown x264 preset: {encoder_preset}")
+        self.software_encoder_args = ['-preset', encoder_preset or self.DEFAULT_X264_PRESET]
+        if crf is not None:
+            self.software_encoder_args += ['-crf', str(crf)]
+        
+        # Segments are encoded side by side; split the cores between the
+        # ffmpeg jobs so parallel encodes don't oversubscribe the CPU
+        self.cpu_count = os.cpu_count() or 1
+        self.max_workers = max_workers or max(1, self.cpu_count // 2)
+        self.encode_threads = max(1, self.cpu_count // self.max_workers)
+        
+        # Every composed segment is encoded with identical stream parameters
+        # and a fixed GOP, so the final concat can splice them with -c copy
+        self.segment_encode_args = [
+            '-r', str(self.fps),
+            '-g', str(self.fps * 2),
+            '-keyint_min', str(self.fps * 2),
+            '-sc_threshold', '0',
+            '-pix_fmt', 'yuv420p',
+            '-profile:v', 'high',
+            '-level', '4.0',
+            '-video_track_timescale', '15360',
+            '-c:a', self.audio_codec,
+            '-ar', '48000',
+            '-ac', '2',
+            '-b:a', '128k'
+        ]
+    
+    @cached_property
+    def ffmpeg_bin(self) -> str:
+        """Absolute path of ffmpeg, resolved once so each spawn skips the PATH search"""
+        return shutil.which('ffmpeg') or 'ffmpeg'
+    
+    @cached_property
+    def ffprobe_bin(self) -> str:
+        """Absolute path of ffprobe, resolved once like ffmpeg_bin"""
+        return shutil.which('ffprobe') or 'ffprobe'
+    
+    @cached_property
+    def ffmpeg_available(self) -> bool:
+        """
+        Whether FFmpeg is installed; the same probe lists its encoders,
+        which hardware encoder detection reuses
+        """
+        if VideoComposer._encoder_listing is None and not shutil.which(self.ffmpeg_bin):
+            # Not on PATH: no need to spawn anything to find out
+            VideoComposer._encoder_listing = ""
+        if VideoComposer._encoder_listing is None:
+            try:
+                result = subprocess.run(
+                    [self.ffmpeg_bin, '-hide_banner', '-encoders'],
+                    capture_output=True,
+                    text=True,
+                    timeout=10
+                )
+                VideoComposer._encoder_listing = result.stdout if result.returncode == 0 else ""
+            except Exception:
+                VideoComposer._encoder_listing = ""
+        return bool(VideoComposer._encoder_listing)
     
     def check_ffmpeg(self) -> bool:
         """Check if FFmpeg is installed"""
+        return self.ffmpeg_available
+    
+    @staticmethod
+    def _run_ffmpeg(command: List[str], timeout: float) -> bool:
+        """
+        Run an ffmpeg command without buffering its console output
+        Only stderr is kept, and just its tail is shown when the command fails
+        A timeout counts as a failure, so callers can fall back
+        """
         try:
             result = subprocess.run(
-                ['ffmpeg', '-version'],
-                capture_output=True,
-                text=True,
-                timeout=5
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=timeout
             )
-            return result.returncode == 0
-        except Exception:
+        except subprocess.TimeoutExpired:
+            print(f"❌ FFmpeg timed out after {timeout} seconds")
             return False
+        if result.returncode != 0:
+            print(f"❌ FFmpeg failed:\n{result.stderr[-4096:].decode(errors='replace')}")
+        return result.returncode == 0
+    
+    def _detect_hw_encoder(self):
+        """Return the first hardware H.264 encoder usable on this machine, or None"""
+        
+        if VideoComposer._hw_encoder_probed:
+            return VideoComposer._hw_encoder
+        VideoComposer._hw_encoder_probed = True
+        
+        if not self.ffmpeg_available:
+            return None
+        
+        for encoder in self.HW_ENCODERS:
+            if encoder not in VideoComposer._encoder_listing:
+                continue
+            
+            # Being compiled in doesn't mean the device is there; try a tiny encode
+            test_cmd = [
+                self.ffmpeg_bin, '-hide_banner', '-v', 'error',
+                '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.1',
+                '-c:v', encoder,
+                '-f', 'null', '-'
+            ]
+            try:
+                test = subprocess.run(
+                    test_cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=15
+                )
+                if test.returncode == 0:
+                    VideoComposer._hw_encoder = encoder
+                    break
+            except Exception:
+                continue
+        
+        return VideoComposer._hw_encoder
+    
+    @property
+    def video_codec_args(self) -> List[str]:
+        """Encoder-specific quality settings for the current video codec"""
+        return self.HW_ENCODERS.get(self.video_codec, self.software_encoder_args)
     
     def create_image_video(self, image_path: str, duration: float, output_path: str) -> bool:
         """Convert static image to video with specified duration"""
         
         command = [
-            'ffmpeg',
+            self.ffmpeg_bin,
             '-loop', '1',
             '-i', image_path,
             '-c:v', self.video_codec,
+            *self.video_codec_args,
             '-t', str(duration),
             '-pix_fmt', 'yuv420p',
             '-vf', f'scale={self.resolution}',
@@ -50,47 +210,31 @@ class VideoComposer:
         ]
         
         try:
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            return result.returncode == 0
+            return self._run_ffmpeg(command, timeout=60)
         except Exception as e:
             print(f"❌ Error creating image video: {e}")
             return False
     
-    def add_fade_transition(self, input_path: str, output_path: str, 
+    def add_fade_transition(self, input_path: str, output_path: str, duration: float = None,
                            fade_in: float = 0.5, fade_out: float = 0.5) -> bool:
-        """Add fade in/out transitions to a video"""
-        
-        # Get video duration first
-        probe_cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            input_path
-        ]
+        """Add fade in/out transitions to a video; pass duration to skip probing"""
         
         try:
-            result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
-            duration = float(result.stdout.strip())
+            if duration is None:
+                duration = self.probe_duration(input_path)
             
             fade_out_start = duration - fade_out
             
             command = [
-                'ffmpeg',
+                self.ffmpeg_bin,
                 '-i', input_path,
                 '-vf', f'fade=t=in:st=0:d={fade_in},fade=t=out:st={fade_out_start}:d={fade_out}',
-                '-c:a', 'copy',
+                *self._stream_args(input_path),
                 '-y',
                 output_path
             ]
             
-            result = subprocess.run(command, capture_output=True, text=True, timeout=60)
-            return result.returncode == 0
+            return self._run_ffmpeg(command, timeout=60)
         
         except Exception as e:
             print(f"❌ Error adding transitions: {e}")
@@ -100,6 +244,14 @@ class VideoComposer:
                        text: str, position: str = "bottom") -> bool:
         """Add text overlay (lower third) to video"""
         
+        # drawtext reads the text from a file, so quotes, colons and
+        # backslashes in it can't break (or inject into) the filter graph
+        text_file = self.temp_dir / f"lt_{Path(output_path).stem}.txt"
+        text_file.write_text(text, encoding="utf-8")
+        
+        font_file = next((font for font in self.FONT_CANDIDATES if os.path.exists(font)), None)
+        font_option = f"fontfile='{font_file}':" if font_file else ""
+        
         # Position settings
         if position == "bottom":
             y_pos = "main_h-100"
@@ -109,21 +261,20 @@ class VideoComposer:
             y_pos = "main_h/2"
         
         command = [
-            'ffmpeg',
+            self.ffmpeg_bin,
             '-i', input_path,
             '-vf', (
-                f"drawtext=text='{text}':"
+                f"drawtext=textfile='{text_file.as_posix()}':expansion=none:{font_option}"
                 f"fontsize=36:fontcolor=white:box=1:boxcolor=black@0.7:"
                 f"boxborderw=10:x=(w-text_w)/2:y={y_pos}"
             ),
-            '-c:a', 'copy',
+            *self._stream_args(input_path),
             '-y',
             output_path
         ]
         
         try:
-            result = subprocess.run(command, capture_output=True, text=True, timeout=60)
-            return result.returncode == 0
+            return self._run_ffmpeg(command, timeout=60)
         except Exception as e:
             print(f"❌ Error adding lower third: {e}")
             return False
@@ -143,47 +294,45 @@ class VideoComposer:
         overlay_pos = positions.get(position, positions["topright"])
         
         command = [
-            'ffmpeg',
+            self.ffmpeg_bin,
             '-i', main_video,
             '-i', overlay_video,
             '-filter_complex',
-            f"[1:v]scale=640:360[overlay];[0:v][overlay]overlay={overlay_pos}",
-            '-c:a', 'copy',
+            f"[1:v]scale=640:360[overlay];[0:v][overlay]overlay={overlay_pos}[v]",
+            *self._stream_args(main_video, video_map='[v]'),
             '-y',
             output_path
         ]
         
         try:
-            result = subprocess.run(command, capture_output=True, text=True, timeout=120)
-            return result.returncode == 0
+            return self._run_ffmpeg(command, timeout=120)
         except Exception as e:
             print(f"❌ Error creating PIP: {e}")
             return False
     
     def concatenate_videos(self, video_list: List[str], output_path: str) -> bool:
-        """Concatenate multiple videos into one"""
+        """
+        Concatenate multiple videos into one
+        video_list holds absolute paths, as returned by compose_segment
+        """
         
         # Create concat file
-        concat_file = os.path.join(self.temp_dir, 'concat_list.txt')
-        with open(concat_file, 'w') as f:
-            for video_path in video_list:
-                # Convert to absolute path
-                abs_path = os.path.abspath(video_path)
-                f.write(f"file '{abs_path}'\n")
+        concat_file = self.temp_dir / 'concat_list.txt'
+        concat_file.write_text("".join(f"file '{video_path}'\n" for video_path in video_list))
         
         command = [
-            'ffmpeg',
+            self.ffmpeg_bin,
             '-f', 'concat',
             '-safe', '0',
-            '-i', concat_file,
+            '-i', str(concat_file),
             '-c', 'copy',
+            '-movflags', '+faststart',
             '-y',
             output_path
         ]
         
         try:
-            result = subprocess.run(command, capture_output=True, text=True, timeout=180)
-            return result.returncode == 0
+            return self._run_ffmpeg(command, timeout=180)
         except Exception as e:
             print(f"❌ Error concatenating videos: {e}")
             return False
@@ -193,7 +342,7 @@ class VideoComposer:
         """Add background music to video"""
         
         command = [
-            'ffmpeg',
+            self.ffmpeg_bin,
             '-i', video_path,
             '-i', audio_path,
             '-filter_complex',
@@ -207,61 +356,302 @@ class VideoComposer:
         ]
         
         try:
-            result = subprocess.run(command, capture_output=True, text=True, timeout=180)
-            return result.returncode == 0
+            return self._run_ffmpeg(command, timeout=180)
         except Exception as e:
             print(f"❌ Error adding background music: {e}")
             return False
     
+    @staticmethod
+    def _file_key(path: str):
+        """Cache key that changes whenever the file is rewritten"""
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    
+    def _has_audio(self, video_path: str) -> bool:
+        """Check whether a video has an audio stream, probing each file version once"""
+        
+        try:
+            cache_key = self._file_key(video_path)
+            if cache_key not in self._audio_cache:
+                probe_cmd = [
+                    self.ffprobe_bin,
+                    '-v', 'error',
+                    '-select_streams', 'a',
+                    '-show_entries', 'stream=codec_type',
+                    '-of', 'csv=p=0',
+                    video_path
+                ]
+                result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
+                self._audio_cache[cache_key] = bool(result.stdout.strip())
+            return self._audio_cache[cache_key]
+        except Exception:
+            # Can't tell; the optional audio map copes either way
+            return True
+    
+    def _stream_args(self, input_path: str, video_map: str = '0:v') -> List[str]:
+        """Output mapping: copy the input's audio when it has some, otherwise drop audio"""
+        
+        if self._has_audio(input_path):
+            return ['-map', video_map, '-map', '0:a?', '-c:a', 'copy']
+        return ['-map', video_map, '-an']
+    
+    def probe_duration(self, video_path: str) -> float:
+        """Read a video's container duration in seconds, probing each file version once"""
+        
+        cache_key = self._file_key(video_path)
+        if cache_key in self._duration_cache:
+            return self._duration_cache[cache_key]
+        
+        probe_cmd = [
+            self.ffprobe_bin,
+            '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            video_path
+        ]
+        
+        result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
+        duration = float(result.stdout.strip())
+        self._duration_cache[cache_key] = duration
+        return duration
+    
+    def _segment_duration(self, segment_info: Dict) -> float:
+        """Probe once and keep the duration on the segment for later passes"""
+        if not segment_info.get('duration'):
+            segment_info['duration'] = self.probe_duration(segment_info['local_path'])
+        return segment_info['duration']
+    
+    def _chart_input_args(self, chart_path: str, duration: float) -> List[str]:
+        """
+        Read the chart PNG as a looped input at the output frame rate, lasting
+        as long as the segment, so it feeds the overlay without a pre-encode
+        """
+        return ['-loop', '1', '-framerate', str(self.fps), '-t', str(duration), '-i', chart_path]
+    
+    @staticmethod
+    def _fade_filter(fade_out_start) -> str:
+        """Half-second fade in at the start and fade out ending with the segment"""
+        return f"fade=t=in:st=0:d=0.5,fade=t=out:st={fade_out_start}:d=0.5"
+    
+    def _segment_video_filter(self, avatar: str, chart: str, fade_out_start, out: str) -> str:
+        """Filter chain that scales the avatar, overlays an optional chart and adds fades"""
+        
+        fades = self._fade_filter(fade_out_start)
+        
+        if not chart:
+            return f"[{avatar}]scale={self.resolution},{fades}[{out}]"
+        
+        # The looped chart never ends on its own; shortest=1 stops the
+        # overlay with the avatar while the chart stays on screen throughout
+        return (
+            f"[{chart}]scale=640:360[{out}_chart];"
+            f"[{avatar}]scale={self.resolution}[{out}_bg];"
+            f"[{out}_bg][{out}_chart]overlay=main_w-overlay_w-20:main_h-overlay_h-20:shortest=1,{fades}[{out}]"
+        )
+    
+    def _segment_video_filter_cuda(self, avatar: str, chart: str, fade_out_start, out: str) -> str:
+        """
+        Same chain for CUDA-decoded avatars: scaling and overlay stay on the GPU
+        and frames come back to system memory once, for the fades
+        """
+        
+        fades = self._fade_filter(fade_out_start)
+        width, height = (int(size) for size in self.resolution.split('x'))
+        background = f"[{avatar}]scale_cuda={width}:{height}:format=yuv420p"
+        
+        if not chart:
+            return f"{background},hwdownload,format=yuv420p,{fades}[{out}]"
+        
+        # The chart is small, so it is scaled on the CPU and uploaded once
+        return (
+            f"[{chart}]scale=640:360,format=yuva420p,hwupload_cuda[{out}_chart];"
+            f"{background}[{out}_bg];"
+            f"[{out}_bg][{out}_chart]overlay_cuda=x={width - 660}:y={height - 380}:shortest=1,"
+            f"hwdownload,format=yuv420p,{fades}[{out}]"
+        )
+    
+    @staticmethod
+    def _segment_audio_filter(has_audio: bool, input_index: int, duration, out: str) -> str:
+        """
+        Audio chain giving every segment the same 48 kHz stereo layout;
+        avatars without sound get a silent track so segments still line up
+        """
+        if has_audio:
+            return f"[{input_index}:a]aresample=48000,aformat=channel_layouts=stereo[{out}]"
+        return f"anullsrc=r=48000:cl=stereo,atrim=duration={duration}[{out}]"
+    
+    def _segment_command(self, avatar_video: str, chart_path: str, duration, fade_out_start,
+                         has_audio: bool, output_path: str, use_cuda: bool = False) -> List[str]:
+        """Build the ffmpeg command composing one segment"""
+        
+        if use_cuda:
+            decode_args = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+            video_filter = self._segment_video_filter_cuda
+        else:
+            # Let ffmpeg decode the avatar on the GPU when we encode there too
+            decode_args = ['-hwaccel', 'auto'] if self.video_codec in self.HW_ENCODERS else []
+            video_filter = self._segment_video_filter
+        
+        if chart_path:
+            inputs = [*self._chart_input_args(chart_path, duration), *decode_args, '-i', avatar_video]
+            filter_graph = video_filter('1:v', '0:v', fade_out_start, 'v')
+            audio_filter = self._segment_audio_filter(has_audio, 1, duration, 'a')
+        else:
+            inputs = [*decode_args, '-i', avatar_video]
+            filter_graph = video_filter('0:v', None, fade_out_start, 'v')
+            audio_filter = self._segment_audio_filter(has_audio, 0, duration, 'a')
+        
+        return [
+            self.ffmpeg_bin,
+            *inputs,
+            '-filter_complex', f"{filter_graph};{audio_filter}",
+            '-map', '[v]',
+            '-map', '[a]',
+            '-c:v', self.video_codec,
+            *self.video_codec_args,
+            *self.segment_encode_args,
+            '-threads', str(self.encode_threads),
+            '-y',
+            output_path
+        ]
+    
+    def _segment_template(self, has_chart: bool, has_audio: bool, use_cuda: bool) -> List[str]:
+        """
+        Segment command with %-placeholders for the per-segment values, built
+        once per shape (chart or not, audio or not, GPU or CPU filters, encoder)
+        """
+        key = (has_chart, has_audio, use_cuda, self.video_codec, self.encode_threads)
+        if key not in self._segment_templates:
+            self._segment_templates[key] = self._segment_command(
+                '%(avatar)s',
+                '%(chart)s' if has_chart else None,
+                '%(duration)s',
+                '%(fade_out_start)s',
+                has_audio,
+                '%(output)s',
+                use_cuda
+            )
+        return self._segment_templates[key]
+    
     def compose_segment(self, segment_info: Dict, chart_path: str = None) -> str:
-        """Compose a single segment with avatar and optional chart"""
+        """
+        Compose a single segment with avatar and optional chart
+        Scaling, chart overlay and fades run as one filter graph, so the
+        avatar is decoded and encoded exactly once
+        Returns the absolute path of the composed video
+        """
         
         segment_id = segment_info['segment_id']
         avatar_video = segment_info['local_path']
         
-        output_path = os.path.join(
-            self.temp_dir,
-            f'composed_segment_{segment_id}.mp4'
-        )
+        output_path = str(self.temp_dir / f'composed_segment_{segment_id}.mp4')
         
         print(f"  🎬 Composing segment {segment_id}...")
         
-        # If no chart, just add transitions to avatar video
-        if not chart_path:
-            transition_path = os.path.join(
-                self.temp_dir,
-                f'transition_segment_{segment_id}.mp4'
-            )
-            if self.add_fade_transition(avatar_video, output_path, 0.5, 0.5):
-                print(f"  ✅ Segment {segment_id} composed (avatar only)")
-                return output_path
+        try:
+            duration = self._segment_duration(segment_info)
+            
+            has_audio = self._has_audio(avatar_video)
+            params = {
+                'avatar': avatar_video,
+                'chart': chart_path,
+                'duration': duration,
+                'fade_out_start': duration - 0.5,
+                'output': output_path
+            }
+            
+            # With NVENC, decode, scale and overlay on the GPU too
+            use_cuda = self.video_codec == "h264_nvenc" and self.cuda_filters
+            template = self._segment_template(bool(chart_path), has_audio, use_cuda)
+            composed = self._run_ffmpeg([arg % params for arg in template], timeout=180)
+            
+            if not composed and use_cuda:
+                # Builds without scale_cuda/overlay_cuda fail here; stay on the CPU filters from now on
+                print(f"  ⚠️  CUDA filters unavailable, composing segment {segment_id} on the CPU")
+                self.cuda_filters = False
+                use_cuda = False
+                template = self._segment_template(bool(chart_path), has_audio, False)
+                composed = self._run_ffmpeg([arg % params for arg in template], timeout=180)
+            
+            if not composed and chart_path:
+                # Re-encode without the chart rather than passing the raw clip on:
+                # the stream-copy concat needs every segment encoded identically
+                print(f"  ⚠️  Chart overlay failed, composing segment {segment_id} with the avatar only")
+                chart_path = None
+                template = self._segment_template(False, has_audio, use_cuda)
+                composed = self._run_ffmpeg([arg % params for arg in template], timeout=180)
+        except Exception as e:
+            print(f"❌ Error composing segment {segment_id}: {e}")
             return None
         
-        # Convert chart to video
-        chart_video = os.path.join(
-            self.temp_dir,
-            f'chart_video_{segment_id}.mp4'
-        )
-        
-        if not self.create_image_video(chart_path, 8.0, chart_video):
-            print(f"  ⚠️  Chart conversion failed, using avatar only")
-            return avatar_video
+        if not composed:
+            return None
         
-        # Create picture-in-picture
-        pip_path = os.path.join(
-            self.temp_dir,
-            f'pip_segment_{segment_id}.mp4'
-        )
+        print(f"  ✅ Segment {segment_id} composed ({'with chart' if chart_path else 'avatar only'})")
+        return output_path
+    
+    def _build_one_shot_graph(self, segments: List[Dict], chart_mapping: Dict) -> List[str]:
+        """
+        Build a single ffmpeg command that composes every segment and joins
+        them with the concat filter, so the whole video is one decode/encode pass
+        """
+        
+        inputs = []
+        input_count = 0
+        filters = []
+        concat_inputs = ""
+        
+        for i, segment in enumerate(segments):
+            duration = self._segment_duration(segment)
+            
+            avatar_index = input_count
+            inputs += ['-i', segment['local_path']]
+            input_count += 1
+            
+            chart = None
+            chart_path = chart_mapping.get(segment['segment_id'])
+            if chart_path:
+                chart = f"{input_count}:v"
+                inputs += self._chart_input_args(chart_path, duration)
+                input_count += 1
+            
+            filters.append(self._segment_video_filter(f"{avatar_index}:v", chart, duration - 0.5, f"s{i}"))
+            
+            # concat needs matching frame rate, SAR and audio layout on every input
+            filters.append(f"[s{i}]fps={self.fps},format=yuv420p,setsar=1[v{i}]")
+            filters.append(self._segment_audio_filter(
+                self._has_audio(segment['local_path']), avatar_index, duration, f"a{i}"
+            ))
+            concat_inputs += f"[v{i}][a{i}]"
+        
+        filters.append(f"{concat_inputs}concat=n={len(segments)}:v=1:a=1[v][a]")
+        
+        return [
+            self.ffmpeg_bin,
+            *inputs,
+            '-filter_complex', ";".join(filters),
+            '-map', '[v]',
+            '-map', '[a]',
+            '-c:v', self.video_codec,
+            *self.video_codec_args,
+            *self.segment_encode_args,
+            '-threads', '0',
+            '-movflags', '+faststart',
+            '-y',
+            self.output_filename
+        ]
+    
+    def _compose_one_shot(self, segments: List[Dict], chart_mapping: Dict) -> bool:
+        """Render the final video in a single ffmpeg process"""
         
-        if self.create_picture_in_picture(
-            avatar_video, chart_video, pip_path, "bottomright"
-        ):
-            # Add transitions
-            if self.add_fade_transition(pip_path, output_path, 0.5, 0.5):
-                print(f"  ✅ Segment {segment_id} composed (with chart)")
-                return output_path
+        print(f"🎬 Composing {len(segments)} segments in one pass...")
         
-        return avatar_video
+        try:
+            command = self._build_one_shot_graph(segments, chart_mapping)
+            return self._run_ffmpeg(command, timeout=600)
+        except Exception as e:
+            print(f"❌ Error composing in one pass: {e}")
+            return False
     
     def create_final_video(self, segments: List[Dict], charts: Dict) -> str:
         """Create the final composed video"""
@@ -287,6 +677,11 @@ class VideoComposer:
         
         print("✅ FFmpeg found!\n")
         
+        hw_encoder = self._detect_hw_encoder()
+        if hw_encoder:
+            self.video_codec = hw_encoder
+            print(f"⚡ Using hardware encoder: {hw_encoder}\n")
+        
         # Map segments to charts
         chart_mapping = {
             1: charts.get('run_rate'),      # Summary with run rate
@@ -294,15 +689,24 @@ class VideoComposer:
             3: charts.get('manhattan')       # Statistics with Manhattan
         }
         
-        composed_segments = []
-        
-        # Compose each segment
-        for segment in segments:
-            chart_path = chart_mapping.get(segment['segment_id'])
-            composed_path = self.compose_segment(segment, chart_path)
-            
-            if composed_path:
-                composed_segments.append(composed_path)
+        if self.compose_strategy == "one_shot":
+            if self._compose_one_shot(segments, chart_mapping):
+                return self._report_final_video()
+            print("⚠️  One-pass composition failed, composing segment by segment\n")
+        
+        # Split and stitch: compose all segments concurrently, then join them
+        # with a stream copy. Each job is its own ffmpeg process, so threads
+        # are enough to keep them running; with fewer segments than workers,
+        # the spare cores go to each job's encoder threads instead
+        workers = min(self.max_workers, len(segments)) or 1
+        self.encode_threads = max(1, self.cpu_count // workers)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            composed_paths = executor.map(
+                lambda segment: self.compose_segment(segment, chart_mapping.get(segment['segment_id'])),
+                segments
+            )
+            composed_segments = [path for path in composed_paths if path]
         
         if not composed_segments:
             print("❌ No segments could be composed")
@@ -312,16 +716,21 @@ class VideoComposer:
         print(f"\n🔗 Concatenating {len(composed_segments)} segments...")
         
         if self.concatenate_videos(composed_segments, self.output_filename):
-            print(f"\n✅ Final video created: {self.output_filename}")
-            
-            # Get file size
-            file_size = os.path.getsize(self.output_filename) / (1024 * 1024)
-            print(f"📦 File size: {file_size:.2f} MB")
-            
-            return self.output_filename
+            return self._report_final_video()
         else:
             print("❌ Failed to concatenate segments")
             return None
+    
+    def _report_final_video(self) -> str:
+        """Print the final video's location and size"""
+        
+        print(f"\n✅ Final video created: {self.output_filename}")
+        
+        # Get file size
+        file_size = os.path.getsize(self.output_filename) / (1024 * 1024)
+        print(f"📦 File size: {file_size:.2f} MB")
+        
+        return self.output_filename
 
 
 # Usage Example
@@ -332,11 +741,8 @@ if __name__ == "__main__":
     
     # Load data from previous steps
     try:
-        with open('avatar_videos.json', 'r') as f:
-            segments = json.load(f)
-        
-        with open('chart_paths.json', 'r') as f:
-            charts = json.load(f)
+        segments = load_json('avatar_videos.json')
+        charts = load_json('chart_paths.json')
     except FileNotFoundError:
         print("❌ Required input files not found!")
         print("   Please run the previous scripts first:")
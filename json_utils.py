@@ -0,0 +1,49 @@
+"""
+JSON helpers shared by the pipeline steps
+Uses orjson (a C extension, several times faster than the stdlib parser)
+when it is installed and falls back to the json module otherwise
+"""
+
+import json
+import mmap
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Files at least this large are memory-mapped and parsed in place
+# instead of being read into a bytes copy first
+MMAP_THRESHOLD = 1 << 20
+
+
+def load_json(path):
+    """Load a JSON file"""
+    if orjson:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    return orjson.loads(view)
+            return orjson.loads(f.read())
+    
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def parse_json(text):
+    """Parse a JSON document from a string or bytes"""
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dump_json(data, path):
+    """Write data to a JSON file, pretty-printed with 2-space indentation"""
+    if orjson:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
@@ -3,13 +3,18 @@ Automated Cricket Commentary Video Generator
 Main orchestrator that runs all components
 """
 
+import argparse
+import asyncio
+import functools
+import hashlib
+import io
 import json
 import os
+import shutil
 import sys
-from datetime import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+import time
+from json_utils import load_json, dump_json
 
 # Color codes for terminal output
 class Colors:
@@ -21,27 +26,74 @@ class Colors:
     RED = '\033[91m'
     END = '\033[0m'
     BOLD = '\033[1m'
+    
+    # No escape codes when output is redirected to a file or pipe
+    if not sys.stdout.isatty():
+        HEADER = BLUE = CYAN = GREEN = YELLOW = RED = END = BOLD = ''
+    
+    # Prefixes and rules used by the print helpers, built once
+    HEADER_PREFIX = f"{BOLD}{CYAN}"
+    HEADER_LINE = f"{BOLD}{CYAN}{'=' * 60}{END}"
+    STEP_PREFIX = f"{BOLD}{BLUE}"
+    STEP_LINE = f"{CYAN}{'-' * 60}{END}"
+    SUMMARY_LINE = f"{CYAN}{'─' * 60}{END}"
+    SUCCESS_PREFIX = f"{GREEN}✅ "
+    ERROR_PREFIX = f"{RED}❌ "
+    WARNING_PREFIX = f"{YELLOW}⚠️  "
+    INFO_PREFIX = f"{CYAN}ℹ️  "
 
 def print_header(text):
-    print(f"\n{Colors.BOLD}{Colors.CYAN}{'=' * 60}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{text.center(60)}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{'=' * 60}{Colors.END}\n")
+    print(f"\n{Colors.HEADER_LINE}\n{Colors.HEADER_PREFIX}{text.center(60)}{Colors.END}\n{Colors.HEADER_LINE}\n")
 
 def print_step(step_num, total_steps, title):
-    print(f"{Colors.BOLD}{Colors.BLUE}[STEP {step_num}/{total_steps}] {title}{Colors.END}")
-    print(f"{Colors.CYAN}{'-' * 60}{Colors.END}")
+    print(f"{Colors.STEP_PREFIX}[STEP {step_num}/{total_steps}] {title}{Colors.END}\n{Colors.STEP_LINE}")
 
 def print_success(message):
-    print(f"{Colors.GREEN}✅ {message}{Colors.END}")
+    print(f"{Colors.SUCCESS_PREFIX}{message}{Colors.END}")
 
 def print_error(message):
-    print(f"{Colors.RED}❌ {message}{Colors.END}")
+    print(f"{Colors.ERROR_PREFIX}{message}{Colors.END}")
 
 def print_warning(message):
-    print(f"{Colors.YELLOW}⚠️  {message}{Colors.END}")
+    print(f"{Colors.WARNING_PREFIX}{message}{Colors.END}")
 
 def print_info(message):
-    print(f"{Colors.CYAN}ℹ️  {message}{Colors.END}")
+    print(f"{Colors.INFO_PREFIX}{message}{Colors.END}")
+
+
+class _ThreadBufferedStdout:
+    """
+    Stand-in for sys.stdout while stages run concurrently: output from a
+    thread that called capture() goes to that thread's buffer, everything
+    else passes straight through
+    """
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+    
+    def capture(self):
+        self._local.buffer = io.StringIO()
+        return self._local.buffer
+    
+    def release(self):
+        self._local.buffer = None
+    
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+    
+    def flush(self):
+        self.stream.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@functools.lru_cache(maxsize=1)
+def _has_ffmpeg():
+    """Whether ffmpeg is on PATH; looked up once per process without spawning it"""
+    return shutil.which('ffmpeg') is not None
 
 
 class CricketCommentaryPipeline:
@@ -52,58 +104,116 @@ class CricketCommentaryPipeline:
         self.output_dir = "cricket_output"
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # Output locations, built once and reused by every stage
+        self.output_path = os.path.abspath(self.output_dir)
+        self.charts_dir = os.path.join(self.output_dir, 'charts')
+        self.scripts_json_path = os.path.join(self.output_dir, 'scripts.json')
+        self.script_cache_path = os.path.join(self.output_dir, 'script_cache')
+        self.final_video_path = os.path.join(self.output_dir, 'cricket_commentary_final.mp4')
+        self.mock_video_path = os.path.join(self.output_dir, 'mock_final_video.txt')
+        self.timings_path = os.path.join(self.output_dir, 'timings.json')
+        
+        # Stage outputs keyed by a hash of their inputs, so reruns skip finished work
+        self.cache_dir = os.path.join(self.output_dir, '.cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.force = self.config.get('force', False)
+        self.debug = self.config.get('debug', False)
+        self.match_data_path = self.config.get('match_data_path')
+        
         # API keys (optional - will use mock data if not provided)
         self.gemini_api_key = self.config.get('gemini_api_key')
         self.avatar_api_key = self.config.get('avatar_api_key')
         self.avatar_provider = self.config.get('avatar_provider', 'heygen')
+        self.avatar_max_workers = self.config.get('avatar_max_workers', 8)
+        self.avatar_max_concurrent_creates = self.config.get('avatar_max_concurrent_creates', 4)
+        # Opt-in: a cache hit replays earlier Gemini wording for this match state
+        self.script_cache_enabled = self.config.get('use_script_cache', False)
+        self.script_cache_similarity = self.config.get('script_cache_similarity', 0.95)
+        self.batch_gemini = self.config.get('batch_gemini', True)
+        self.compose_strategy = self.config.get('compose_strategy', 'split')
+        self.compose_workers = self.config.get('compose_workers')
+        self.chart_workers = self.config.get('chart_workers', 4)
+        self.encoder_preset = self.config.get('encoder_preset', 'ultrafast')
+        self.encoder_crf = self.config.get('encoder_crf', 28)
         
         # Pipeline state
         self.match_data = None
         self.script_segments = None
+        self.segments_soa = None
         self.charts = None
         self.avatar_videos = None
         self.final_video = None
+        self.timings = {}
+        self._pending_charts = None  # (chart generator, cache path) while chart files are still being written
     
     def run_full_pipeline(self):
         """Execute the complete video generation pipeline"""
+        return asyncio.run(self.run_full_pipeline_async())
+    
+    async def run_full_pipeline_async(self):
+        """
+        Execute the pipeline, overlapping the stages that don't depend on each other:
+        scripts (waiting on Gemini) and charts (CPU work on the match data) run together
+        """
         
         print_header("AUTOMATED CRICKET COMMENTARY VIDEO GENERATOR")
         
-        start_time = datetime.now()
-        total_steps = 4
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        
+        # Stage groups in order; the stages inside a group run concurrently.
+        # Each stage is (step title, method, success message, failure message)
+        stages = [
+            (
+                ("Generating Commentary Scripts", self.generate_scripts,
+                 "Scripts generated successfully", "Script generation failed"),
+                ("Generating Charts & Visualizations", self.generate_charts,
+                 "Charts generated successfully", "Chart generation failed"),
+            ),
+            (
+                ("Generating AI Avatar Videos", self.generate_avatar_videos,
+                 "Avatar videos generated successfully", "Avatar video generation failed"),
+            ),
+            (
+                ("Composing Final Video", self.compose_final_video,
+                 "Final video composed successfully", "Video composition failed"),
+            ),
+        ]
+        total_steps = sum(len(group) for group in stages)
+        self.timings = {}
         
         try:
-            # Step 1: Generate Commentary Scripts
-            print_step(1, total_steps, "Generating Commentary Scripts")
-            if not self.generate_scripts():
-                print_error("Script generation failed")
-                return False
-            print_success("Scripts generated successfully\n")
-            
-            # Step 2: Generate Charts
-            print_step(2, total_steps, "Generating Charts & Visualizations")
-            if not self.generate_charts():
-                print_error("Chart generation failed")
-                return False
-            print_success("Charts generated successfully\n")
-            
-            # Step 3: Generate Avatar Videos
-            print_step(3, total_steps, "Generating AI Avatar Videos")
-            if not self.generate_avatar_videos():
-                print_error("Avatar video generation failed")
-                return False
-            print_success("Avatar videos generated successfully\n")
-            
-            # Step 4: Compose Final Video
-            print_step(4, total_steps, "Composing Final Video")
-            if not self.compose_final_video():
-                print_error("Video composition failed")
-                return False
-            print_success("Final video composed successfully\n")
+            # Charts only need the match data, so load it before either stage starts
+            self.load_match_data()
+            
+            step = 0
+            for group in stages:
+                if len(group) == 1:
+                    title, method, _, _ = group[0]
+                    step += 1
+                    print_step(step, total_steps, title)
+                    outcomes = [(self._run_stage(title, method), None)]
+                else:
+                    outcomes = await self._run_concurrently(loop, group)
+                
+                failed = False
+                for (title, _, success, failure), (ok, output) in zip(group, outcomes):
+                    if output is not None:
+                        # Concurrent stage: its step header and logs are shown together
+                        step += 1
+                        print_step(step, total_steps, title)
+                        print(output, end='')
+                    if ok:
+                        print_success(success)
+                    else:
+                        print_error(failure)
+                        failed = True
+                if failed:
+                    return False
+                print()
             
             # Success summary
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start_time
             
             print_header("PIPELINE COMPLETE!")
             print_info(f"Total time: {duration:.2f} seconds")
@@ -118,48 +228,175 @@ class CricketCommentaryPipeline:
             import traceback
             traceback.print_exc()
             return False
+        
+        finally:
+            try:
+                self._flush_charts()
+            except Exception as e:
+                print_error(f"Chart write error: {e}")
+            if self.timings:
+                dump_json(self.timings, self.timings_path)
+    
+    def _run_stage(self, title, method):
+        """Run one stage method, recording its wall-clock time in self.timings"""
+        stage_start = time.perf_counter()
+        try:
+            return method()
+        finally:
+            self.timings[title] = round(time.perf_counter() - stage_start, 3)
+    
+    async def _run_concurrently(self, loop, group):
+        """
+        Run a group of stages side by side, each logging into its own buffer
+        so their output doesn't interleave. Returns (ok, output) per stage
+        """
+        stdout = _ThreadBufferedStdout(sys.stdout)
+        
+        def run(title, method):
+            buffer = stdout.capture()
+            try:
+                return self._run_stage(title, method), buffer.getvalue()
+            finally:
+                stdout.release()
+        
+        sys.stdout = stdout
+        try:
+            return await asyncio.gather(*(
+                loop.run_in_executor(None, run, title, method)
+                for title, method, _, _ in group
+            ))
+        finally:
+            sys.stdout = stdout.stream
+    
+    def _stage_cache(self, stage, inputs):
+        """
+        Look up a stage's cached output for these inputs
+        Returns (cache_path, cached_output), with None on a miss or when forced.
+        Output files are written to fixed paths, so an entry is also a miss once
+        any file it recorded has been rewritten since (e.g. by a run on other inputs)
+        """
+        digest = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{stage}_{digest[:16]}.json")
+        
+        if self.force or not os.path.exists(cache_path):
+            return cache_path, None
+        try:
+            entry = load_json(cache_path)
+        except Exception:
+            return cache_path, None
+        
+        if not isinstance(entry, dict) or 'output' not in entry:
+            return cache_path, None  # Written by an older version
+        if entry.get('files', {}) != self._file_stamps(entry.get('files', {})):
+            return cache_path, None
+        return cache_path, entry['output']
+    
+    def _save_stage_cache(self, cache_path, output, paths=()):
+        """Store a stage's output with the stamps of the files it wrote"""
+        dump_json({'output': output, 'files': self._file_stamps(paths)}, cache_path)
+    
+    @staticmethod
+    def _file_stamps(paths):
+        """Path -> [mtime_ns, size] of each existing file"""
+        stamps = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = [st.st_mtime_ns, st.st_size]
+        return stamps
+    
+    @staticmethod
+    def _file_versions(paths):
+        """Path -> modification time, so cache keys change when an input file is rewritten"""
+        return {path: os.stat(path).st_mtime_ns for path in paths if path and os.path.exists(path)}
+    
+    def load_match_data(self):
+        """Load the match data shared by the script and chart stages"""
+        
+        if self.match_data_path:
+            self.match_data = load_json(self.match_data_path)
+            print_info(f"Loaded match data from {self.match_data_path}")
+            return
+        
+        try:
+            from cricket_script_generator import MOCK_MATCH_DATA
+            
+            self.match_data = MOCK_MATCH_DATA
+            print_info("Using mock match data")
+            
+        except ImportError:
+            print_warning("Script generator module not found - using inline mock data")
+            # Fallback: create basic mock data inline
+            self.match_data = {
+                "match_id": "TEST_001",
+                "teams": {"batting": "India", "bowling": "Australia"},
+                "current_score": {"runs": 156, "wickets": 3, "overs": 25.4}
+            }
     
     def generate_scripts(self):
         """Step 1: Generate commentary scripts using Gemini"""
         
         try:
             # Import the script generator (assuming previous code is in a module)
-            from cricket_script_generator import (
-                CommentaryScriptGenerator, 
-                MOCK_MATCH_DATA
-            )
+            from cricket_script_generator import CommentaryScriptGenerator, ScriptCache
+            
+            if self.match_data is None:
+                self.load_match_data()
+            
+            cache_path, cached = self._stage_cache('scripts', {
+                'match_data': self.match_data,
+                'gemini': bool(self.gemini_api_key),
+                'batch': self.batch_gemini
+            })
+            if cached is not None:
+                self.script_segments = cached
+                self._build_segments_soa()
+                print_info(f"Reusing {len(cached)} cached script segments")
+                return True
             
-            self.match_data = MOCK_MATCH_DATA
+            # Reruns on the same (or a near-identical) match state reuse earlier
+            # Gemini scripts instead of paying for another round-trip
+            cache = None
+            if self.gemini_api_key and self.script_cache_enabled:
+                cache = ScriptCache(
+                    path=self.script_cache_path,
+                    similarity_threshold=self.script_cache_similarity
+                )
             
-            generator = CommentaryScriptGenerator(api_key=self.gemini_api_key)
+            # Batched: every segment comes back from one JSON-mode Gemini request
+            generator = CommentaryScriptGenerator(
+                api_key=self.gemini_api_key,
+                cache=cache,
+                batch=self.batch_gemini
+            )
             
-            print_info("Using mock match data")
             if self.gemini_api_key:
                 print_info("Using Gemini API for script generation")
             else:
                 print_warning("No Gemini API key - using mock scripts")
             
             self.script_segments = generator.create_timed_script(self.match_data)
+            self._build_segments_soa()
+            self._save_stage_cache(cache_path, self.script_segments)
             
             # Save for debugging
-            with open(os.path.join(self.output_dir, 'scripts.json'), 'w') as f:
-                json.dump({
+            if self.debug:
+                dump_json({
                     'match_data': self.match_data,
                     'segments': self.script_segments
-                }, f, indent=2)
+                }, self.scripts_json_path)
             
             print_info(f"Generated {len(self.script_segments)} script segments")
             
             return True
             
         except ImportError:
-            print_warning("Script generator module not found - using inline mock data")
+            print_warning("Script generator module not found - using inline mock scripts")
             # Fallback: create basic mock data inline
-            self.match_data = {
-                "match_id": "TEST_001",
-                "teams": {"batting": "India", "bowling": "Australia"},
-                "current_score": {"runs": 156, "wickets": 3, "overs": 25.4}
-            }
+            if self.match_data is None:
+                self.load_match_data()
             self.script_segments = [
                 {
                     "id": 1,
@@ -168,23 +405,61 @@ class CricketCommentaryPipeline:
                     "duration": 45
                 }
             ]
+            self._build_segments_soa()
             return True
         
         except Exception as e:
             print_error(f"Script generation error: {e}")
             return False
     
+    def _build_segments_soa(self):
+        """
+        Column view of script_segments (ids, types, durations, scripts), plus
+        each segment's start offset in the final video, for whole-array math
+        """
+        import numpy as np
+        
+        segments = self.script_segments
+        count = len(segments)
+        durations = np.fromiter((segment['duration'] for segment in segments),
+                                dtype=np.float32, count=count)
+        self.segments_soa = {
+            'ids': np.fromiter((segment['id'] for segment in segments), dtype=np.int32, count=count),
+            'types': [segment['type'] for segment in segments],
+            'durations': durations,
+            'starts': np.cumsum(durations) - durations,
+            'scripts': [segment['script'] for segment in segments],
+        }
+    
     def generate_charts(self):
         """Step 2: Generate visualization charts"""
         
         try:
             from cricket_chart_generator import CricketChartGenerator
             
+            if self.match_data is None:
+                self.load_match_data()
+            
+            cache_path, cached = self._stage_cache('charts', {'match_data': self.match_data})
+            if cached is not None:
+                self.charts = cached
+                print_info(f"Reusing {len(cached)} cached charts")
+                return True
+            
+            # Each chart renders in its own worker process (Agg backend). With a
+            # single worker, the PNG encodes and writes instead run in the
+            # background and are only waited on before composing
             chart_gen = CricketChartGenerator(
-                output_dir=os.path.join(self.output_dir, 'charts')
+                output_dir=self.charts_dir,
+                max_workers=self.chart_workers,
+                defer_write=self.chart_workers <= 1
             )
             
             self.charts = chart_gen.generate_all_charts(self.match_data)
+            if chart_gen.defer_write:
+                self._pending_charts = (chart_gen, cache_path)
+            else:
+                self._save_stage_cache(cache_path, self.charts, self.charts.values())
             
             print_info(f"Generated {len(self.charts)} charts")
             for chart_type, path in self.charts.items():
@@ -202,9 +477,23 @@ class CricketCommentaryPipeline:
         try:
             from cricket_avatar_generator import AvatarVideoGenerator
             
+            cache_path, cached = self._stage_cache('avatars', {
+                'segments': self.script_segments,
+                'provider': self.avatar_provider,
+                'api': bool(self.avatar_api_key)
+            })
+            if cached and self._avatar_videos_complete(cached):
+                self.avatar_videos = cached
+                print_info(f"Reusing {len(cached)} cached avatar videos")
+                return True
+            
+            # Jobs are submitted and polled concurrently; these caps keep
+            # the bursts within the provider's rate limits
             avatar_gen = AvatarVideoGenerator(
                 provider=self.avatar_provider,
-                api_key=self.avatar_api_key
+                api_key=self.avatar_api_key,
+                max_workers=self.avatar_max_workers,
+                max_concurrent_creates=self.avatar_max_concurrent_creates
             )
             
             if self.avatar_api_key:
@@ -215,6 +504,11 @@ class CricketCommentaryPipeline:
             self.avatar_videos = avatar_gen.generate_commentary_videos(
                 self.script_segments
             )
+            # Mock stand-ins and partial results are not worth replaying: a
+            # transient API failure should be retried on the next run
+            if self._avatar_videos_complete(self.avatar_videos):
+                self._save_stage_cache(cache_path, self.avatar_videos,
+                                       [video['local_path'] for video in self.avatar_videos])
             
             print_info(f"Generated {len(self.avatar_videos)} avatar videos")
             
@@ -224,42 +518,83 @@ class CricketCommentaryPipeline:
             print_error(f"Avatar video generation error: {e}")
             return False
     
+    def _avatar_videos_complete(self, videos):
+        """Whether every script segment has a real (non-mock) video on disk"""
+        segment_ids = {segment['id'] for segment in self.script_segments}
+        return (
+            {video['segment_id'] for video in videos} == segment_ids
+            and all(
+                video.get('status') == 'completed'
+                and video.get('provider', 'mock') != 'mock'
+                and os.path.exists(video['local_path'])
+                for video in videos
+            )
+        )
+    
+    def _flush_charts(self):
+        """Wait for deferred chart files, then cache the charts stage"""
+        if self._pending_charts is None:
+            return
+        chart_gen, cache_path = self._pending_charts
+        self._pending_charts = None
+        chart_gen.flush_writes()
+        self._save_stage_cache(cache_path, self.charts, self.charts.values())
+    
     def compose_final_video(self):
         """Step 4: Compose final video with FFmpeg"""
         
         try:
+            self._flush_charts()
+            
             from cricket_video_composer import VideoComposer
             
             composer = VideoComposer(
-                output_filename=os.path.join(
-                    self.output_dir,
-                    'cricket_commentary_final.mp4'
-                )
+                output_filename=self.final_video_path,
+                max_workers=self.compose_workers,
+                compose_strategy=self.compose_strategy,
+                encoder_preset=self.encoder_preset,
+                crf=self.encoder_crf
             )
             
             # Check FFmpeg availability
-            if not composer.check_ffmpeg():
+            if not _has_ffmpeg():
                 print_warning("FFmpeg not installed - creating mock output")
-                self.final_video = os.path.join(
-                    self.output_dir,
-                    'mock_final_video.txt'
-                )
+                self.final_video = self.mock_video_path
                 with open(self.final_video, 'w') as f:
                     f.write("Mock final video\n")
                     f.write("Install FFmpeg for actual video composition\n")
                 return True
             
+            # Key on the input files' versions too: regenerated clips keep their paths
+            input_paths = [video['local_path'] for video in self.avatar_videos] + list(self.charts.values())
+            cache_path, cached = self._stage_cache('final', {
+                'avatar_videos': self.avatar_videos,
+                'charts': self.charts,
+                'strategy': self.compose_strategy,
+                'encoder': [self.encoder_preset, self.encoder_crf],
+                'versions': self._file_versions(input_paths)
+            })
+            if cached is not None:
+                self.final_video = cached['final_video']
+                print_info(f"Reusing cached final video: {self.final_video}")
+                return True
+            
             self.final_video = composer.create_final_video(
                 self.avatar_videos,
                 self.charts
             )
             
-            if self.final_video and os.path.exists(self.final_video):
-                file_size = os.path.getsize(self.final_video) / (1024 * 1024)
-                print_info(f"Final video size: {file_size:.2f} MB")
-                return True
+            if not self.final_video:
+                return False
             
-            return False
+            # One stat() call both checks the file exists and gives its size
+            try:
+                file_size = os.stat(self.final_video).st_size / (1024 * 1024)
+            except FileNotFoundError:
+                return False
+            print_info(f"Final video size: {file_size:.2f} MB")
+            self._save_stage_cache(cache_path, {'final_video': self.final_video}, [self.final_video])
+            return True
             
         except Exception as e:
             print_error(f"Video composition error: {e}")
@@ -269,7 +604,7 @@ class CricketCommentaryPipeline:
         """Print pipeline execution summary"""
         
         print(f"\n{Colors.BOLD}📊 PIPELINE SUMMARY{Colors.END}")
-        print(f"{Colors.CYAN}{'─' * 60}{Colors.END}")
+        print(Colors.SUMMARY_LINE)
         
         print(f"\n{Colors.BOLD}Match Data:{Colors.END}")
         if self.match_data:
@@ -279,15 +614,19 @@ class CricketCommentaryPipeline:
             print(f"  Score: {score.get('runs', 0)}/{score.get('wickets', 0)} ({score.get('overs', 0)} ov)")
         
         print(f"\n{Colors.BOLD}Generated Assets:{Colors.END}")
-        if self.script_segments:
-            print(f"  📝 Scripts: {len(self.script_segments)} segments")
+        if self.segments_soa:
+            soa = self.segments_soa
+            print(f"  📝 Scripts: {len(soa['ids'])} segments, {soa['durations'].sum():.0f}s of commentary")
+            for segment_id, segment_type, start, duration in zip(
+                    soa['ids'].tolist(), soa['types'], soa['starts'].tolist(), soa['durations'].tolist()):
+                print(f"     {segment_id}. {segment_type:<12} {int(start) // 60}:{int(start) % 60:02d} ({duration:.0f}s)")
         if self.charts:
             print(f"  📊 Charts: {len(self.charts)} visualizations")
         if self.avatar_videos:
             print(f"  🎬 Avatar Videos: {len(self.avatar_videos)} clips")
         
         print(f"\n{Colors.BOLD}Output Location:{Colors.END}")
-        print(f"  📁 {os.path.abspath(self.output_dir)}")
+        print(f"  📁 {self.output_path}")
         
         if self.final_video:
             print(f"\n{Colors.BOLD}Final Video:{Colors.END}")
@@ -331,6 +670,22 @@ pass
 def main():
     """Main entry point"""
     
+    parser = argparse.ArgumentParser(description="Automated cricket commentary video generator")
+    parser.add_argument('--force', action='store_true',
+                        help="ignore cached stage outputs and rerun every stage")
+    parser.add_argument('--debug', action='store_true',
+                        help="write scripts.json with the match data and generated scripts")
+    parser.add_argument('--match-data', metavar='PATH',
+                        help="load match data from this JSON file instead of the mock data")
+    parser.add_argument('--no-dotenv', action='store_true',
+                        help="don't load API keys from a .env file")
+    args = parser.parse_args()
+    
+    # Loaded only once we know the pipeline will run (not for --help)
+    if not args.no_dotenv:
+        from dotenv import load_dotenv
+        load_dotenv()
+    
     print_header("CRICKET COMMENTARY VIDEO GENERATOR")
     print(f"{Colors.CYAN}Automated AI-powered cricket commentary video creation{Colors.END}\n")
     
@@ -340,19 +695,41 @@ def main():
         'gemini_api_key': None,  # os.getenv('GEMINI_API_KEY')
         'avatar_api_key': None,  # os.getenv('HEYGEN_API_KEY') or os.getenv('DID_API_KEY')
         'avatar_provider': 'heygen',  # 'heygen' or 'd-id'
+        'avatar_max_workers': 8,  # Parallel status checks / downloads
+        'avatar_max_concurrent_creates': 4,  # Video jobs submitted at once
+        'use_script_cache': False,  # Reuse Gemini scripts across reruns (opt-in)
+        'script_cache_similarity': 0.95,  # Cosine threshold for near-miss reuse (needs sentence-transformers)
+        'batch_gemini': True,  # One Gemini request for all segments instead of one per segment
+        'force': args.force,  # Rerun every stage even when cached outputs exist
+        'match_data_path': args.match_data,  # JSON match data file; None = mock data
+        'debug': args.debug,  # Also write scripts.json (match data + segments) for inspection
+        'compose_strategy': 'split',  # 'split' (parallel segments + concat) or 'one_shot' (single ffmpeg graph)
+        'compose_workers': None,  # Parallel segment encodes; None = half the CPU cores
+        'chart_workers': 4,  # Chart render processes; 1 renders serially in-process
+        # Software (x264) encode speed vs quality. ultrafast + crf 28 encodes several
+        # times faster than the defaults, with somewhat softer frames and larger
+        # files per quality level; use e.g. 'medium' + 20 for a quality render.
+        # Hardware encoders keep their own settings.
+        'encoder_preset': 'ultrafast',
+        'encoder_crf': 28,  # Lower = better quality; None = x264 default (23)
     }
     
-    # Check for API keys from environment
-    if os.getenv('GEMINI_API_KEY'):
-        config['gemini_api_key'] = os.getenv('GEMINI_API_KEY')
+    # Check for API keys from environment (read each variable once)
+    env = os.environ
+    gemini_key = env.get('GEMINI_API_KEY')
+    heygen_key = env.get('HEYGEN_API_KEY')
+    did_key = env.get('DID_API_KEY')
+    
+    if gemini_key:
+        config['gemini_api_key'] = gemini_key
         print_info("Gemini API key found in environment")
     
-    if os.getenv('HEYGEN_API_KEY'):
-        config['avatar_api_key'] = os.getenv('HEYGEN_API_KEY')
+    if heygen_key:
+        config['avatar_api_key'] = heygen_key
         config['avatar_provider'] = 'heygen'
         print_info("HeyGen API key found in environment")
-    elif os.getenv('DID_API_KEY'):
-        config['avatar_api_key'] = os.getenv('DID_API_KEY')
+    elif did_key:
+        config['avatar_api_key'] = did_key
         config['avatar_provider'] = 'd-id'
         print_info("D-ID API key found in environment")
     